@@ -2,21 +2,50 @@
 Admin panel routes and functionality
 """
 
-from flask import render_template, request, redirect, url_for, flash, session
-from app import app
-from models import User, Job, Event, Message
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session
+from models import User, Job, Event, Message, versions, archived, archived_count
 from auth import admin_required, get_current_user
+from http_cache import conditional
+from tasks import task, enqueue, task_queue, LOW
+from search_cache import search_cache, search_fields
+from sessions import session_store
 import logging
 
-@app.route('/admin')
+admin_bp = Blueprint('admin', __name__)
+logger = logging.getLogger(__name__)
+
+# Platform totals for the dashboard, rolled up in the background after writes
+platform_stats = {}
+
+@task('roll_up_stats', priority=LOW, unique=True)
+def roll_up_stats():
+    """Recompute the platform totals shown on the admin dashboard"""
+    from models import messages  # Import here to avoid circular import
+    
+    platform_stats.update({
+        'total_users': (len([user for user in User.get_all_users() if user.user_type != 'admin'])
+                        + archived_count('users')),
+        'total_jobs': len(Job.get_all_jobs()),
+        'total_events': len(Event.get_all_events()),
+        'total_messages': len(messages) + archived_count('messages'),
+        'archived_messages': archived_count('messages'),
+        'version': platform_stats.get('version', 0) + 1
+    })
+
+def _dashboard_validator():
+    """Validator for the dashboard: store versions, rolled-up totals and queue activity"""
+    return (tuple(versions.values()), platform_stats.get('version'),
+            task_queue.enqueued, task_queue.completed, task_queue.failed, task_queue.retried,
+            search_cache.hits, search_cache.misses)
+
+@admin_bp.route('/admin')
 @admin_required
+@conditional(_dashboard_validator)
 def admin_dashboard():
     """Admin dashboard"""
-    # Get statistics
-    total_users = len([user for user in User.get_all_users() if user.user_type != 'admin'])
-    total_jobs = len(Job.get_all_jobs())
-    total_events = len(Event.get_all_events())
-    total_messages = len(list(messages.values()))
+    # Totals come from the latest roll-up; compute them here only before the first one
+    if not platform_stats:
+        roll_up_stats()
     
     # Get recent activity
     recent_users = sorted([user for user in User.get_all_users() 
@@ -27,99 +56,114 @@ def admin_dashboard():
     recent_events = sorted(Event.get_all_events(), 
                           key=lambda x: x.created_at, reverse=True)[:5]
     
-    from models import messages  # Import here to avoid circular import
-    
     return render_template('admin.html',
-                         stats={
-                             'total_users': total_users,
-                             'total_jobs': total_jobs,
-                             'total_events': total_events,
-                             'total_messages': total_messages
-                         },
+                         stats=platform_stats,
+                         task_stats=task_queue.stats(),
+                         search_stats=search_cache.stats(),
                          recent_users=recent_users,
                          recent_jobs=recent_jobs,
                          recent_events=recent_events)
 
-@app.route('/admin/users')
+@admin_bp.route('/admin/users')
 @admin_required
+@conditional(lambda: (versions['users'], archived_count('users')))
 def admin_users():
     """Manage users"""
     users = [user for user in User.get_all_users() if user.user_type != 'admin']
-    return render_template('admin.html', view='users', users=users)
+    return render_template('admin.html', view='users', users=users,
+                         archived_users=archived('users'))
 
-@app.route('/admin/user/<user_id>/toggle_status')
+@admin_bp.route('/admin/user/<user_id>/toggle_status')
 @admin_required
 def admin_toggle_user_status(user_id):
     """Toggle user active status"""
     user = User.get_by_id(user_id)
     if not user:
         flash('User not found', 'error')
-        return redirect(url_for('admin_users'))
+        return redirect(url_for('admin.admin_users'))
     
     if user.user_type == 'admin':
         flash('Cannot modify admin user', 'error')
-        return redirect(url_for('admin_users'))
+        return redirect(url_for('admin.admin_users'))
     
+    before = search_fields(user)
     user.is_active = not user.is_active
+    user.touch()
+    if not user.is_active:
+        # Sign the user out everywhere straight away
+        session_store.revoke_user(user.id)
+    search_cache.user_changed(before, user)
+    enqueue('reindex_user', user.id)
+    enqueue('roll_up_stats')
     status = 'activated' if user.is_active else 'deactivated'
     flash(f'User {user.username} has been {status}', 'success')
-    logging.info(f'Admin toggled user status: {user.username} -> {status}')
+    logger.info('Admin toggled user status: %s -> %s', user.username, status)
     
-    return redirect(url_for('admin_users'))
+    return redirect(url_for('admin.admin_users'))
 
-@app.route('/admin/jobs')
+@admin_bp.route('/admin/jobs')
 @admin_required
+@conditional(lambda: (versions['jobs'], versions['users'], archived_count('jobs')))
 def admin_jobs():
     """Manage jobs"""
-    jobs = Job.get_all_jobs()
+    jobs = Job.get_all_jobs(include_inactive=True)
     jobs.sort(key=lambda x: x.created_at, reverse=True)
-    return render_template('admin.html', view='jobs', jobs=jobs)
+    return render_template('admin.html', view='jobs', jobs=jobs,
+                         archived_jobs=archived('jobs'))
 
-@app.route('/admin/job/<job_id>/toggle_status')
+@admin_bp.route('/admin/job/<job_id>/toggle_status')
 @admin_required
 def admin_toggle_job_status(job_id):
     """Toggle job active status"""
     job = Job.get_by_id(job_id)
     if not job:
         flash('Job not found', 'error')
-        return redirect(url_for('admin_jobs'))
+        return redirect(url_for('admin.admin_jobs'))
     
     job.is_active = not job.is_active
+    job.touch()
+    enqueue('roll_up_stats')
     status = 'activated' if job.is_active else 'deactivated'
     flash(f'Job "{job.title}" has been {status}', 'success')
-    logging.info(f'Admin toggled job status: {job.title} -> {status}')
+    logger.info('Admin toggled job status: %s -> %s', job.title, status)
     
-    return redirect(url_for('admin_jobs'))
+    return redirect(url_for('admin.admin_jobs'))
 
-@app.route('/admin/events')
+@admin_bp.route('/admin/events')
 @admin_required
+@conditional(lambda: (versions['events'], versions['users'], archived_count('events')))
 def admin_events():
     """Manage events"""
-    events = Event.get_all_events()
+    events = Event.get_all_events(include_inactive=True)
     events.sort(key=lambda x: x.created_at, reverse=True)
-    return render_template('admin.html', view='events', events=events)
+    return render_template('admin.html', view='events', events=events,
+                         archived_events=archived('events'))
 
-@app.route('/admin/event/<event_id>/toggle_status')
+@admin_bp.route('/admin/event/<event_id>/toggle_status')
 @admin_required
 def admin_toggle_event_status(event_id):
     """Toggle event active status"""
     event = Event.get_by_id(event_id)
     if not event:
         flash('Event not found', 'error')
-        return redirect(url_for('admin_events'))
+        return redirect(url_for('admin.admin_events'))
     
     event.is_active = not event.is_active
+    event.touch()
+    enqueue('roll_up_stats')
     status = 'activated' if event.is_active else 'deactivated'
     flash(f'Event "{event.title}" has been {status}', 'success')
-    logging.info(f'Admin toggled event status: {event.title} -> {status}')
+    logger.info('Admin toggled event status: %s -> %s', event.title, status)
     
-    return redirect(url_for('admin_events'))
+    return redirect(url_for('admin.admin_events'))
 
-@app.route('/admin/messages')
+@admin_bp.route('/admin/messages')
 @admin_required
+@conditional(lambda: (versions['messages'], versions['users'], archived_count('messages')))
 def admin_messages():
-    """View all messages"""
+    """View all messages held in memory (old read messages live in the cold tier)"""
     from models import messages  # Import here to avoid circular import
     all_messages = list(messages.values())
     all_messages.sort(key=lambda x: x.created_at, reverse=True)
-    return render_template('admin.html', view='messages', messages=all_messages)
+    return render_template('admin.html', view='messages', messages=all_messages,
+                         archived_message_count=archived_count('messages'))
@@ -1,24 +1,67 @@
 import os
-import logging
 from flask import Flask
 from werkzeug.middleware.proxy_fix import ProxyFix
 
-# Configure logging for debugging
-logging.basicConfig(level=logging.DEBUG)
+def register_blueprints(app):
+    """Import and register the route blueprints"""
+    # Route modules are imported lazily so importing this module stays cheap
+    from routes import main_bp
+    from auth import auth_bp
+    from admin import admin_bp
+    
+    app.register_blueprint(main_bp)
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(admin_bp)
 
-# Create the Flask application
-app = Flask(__name__)
-
-# Set secret key for session management
-app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
-
-# Configure proxy fix for proper URL generation
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
-
-# Import routes after creating the app to avoid circular imports
-from routes import *
-from auth import *
-from admin import *
+def create_app(config=None):
+    """Create and configure the Flask application"""
+    app = Flask(__name__)
+    
+    # Set secret key for session management
+    app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
+    if config:
+        app.config.update(config)
+    
+    # Session data stays on the server; the cookie holds only a random session id
+    from sessions import init_sessions
+    init_sessions(app)
+    
+    # Structured logging written by a background thread, with request ids and timings
+    from logs import init_logging
+    init_logging(app)
+    
+    # Configure proxy fix for proper URL generation
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+    
+    # Serve fingerprinted, precompressed static assets with long-lived caching
+    from assets import init_assets
+    init_assets(app)
+    
+    from utils import register_template_helpers
+    register_template_helpers(app)
+    
+    # Compiled-template cache on disk and the {% cache %} tag for rendered fragments
+    from fragments import init_templates
+    init_templates(app)
+    
+    register_blueprints(app)
+    
+    # Start the background task queue once the route modules have registered their tasks
+    from tasks import init_tasks
+    init_tasks(app)
+    
+    # Move inactive and aged records to compact cold storage in the background
+    from tiering import init_tiering
+    init_tiering(app)
+    
+    # Seed the admin user once the app is being built, not when models is imported
+    from models import init_data
+    init_data()
+    
+    from autocomplete import build_indexes
+    build_indexes()
+    
+    return app
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    create_app().run(host='0.0.0.0', port=5000, debug=True)
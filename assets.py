@@ -0,0 +1,179 @@
+"""
+Static asset pipeline: fingerprinting, precompression and long-lived caching
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import tempfile
+
+import click
+from flask import abort, request, send_file, url_for
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always produced
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Source files (relative to the static folder) that go through the pipeline
+ASSET_SOURCES = ['css/style.css', 'js/main.js']
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+TEMP_SUFFIX = '.tmp'
+
+# Fingerprinted files never change, so clients may keep them for a year
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Logical filename -> fingerprinted filename, loaded from the manifest
+manifest = {}
+
+# Fingerprinted filename -> {content-encoding: path on disk}
+_variants = {}
+
+
+def _fingerprint(data):
+    """Short content hash used in asset filenames"""
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def _write_atomic(path, data):
+    """Write a file under a temporary name and rename it into place"""
+    # Workers may build at the same time; none of them may serve a half-written file
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.', suffix=TEMP_SUFFIX)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(temp_path, 0o644)  # mkstemp creates owner-only files
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def build_assets(static_folder, sources=None):
+    """Fingerprint static assets and write gzip/brotli variants to the dist folder"""
+    dist_folder = os.path.join(static_folder, DIST_DIR)
+    built = {}
+
+    for source in sources or ASSET_SOURCES:
+        with open(os.path.join(static_folder, source), 'rb') as f:
+            data = f.read()
+
+        base, ext = os.path.splitext(source)
+        fingerprinted = f'{base}.{_fingerprint(data)}{ext}'
+        target = os.path.join(dist_folder, fingerprinted)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+
+        _write_atomic(target, data)
+        _write_atomic(target + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            _write_atomic(target + '.br', brotli.compress(data, quality=11))
+
+        built[source] = fingerprinted
+
+    _write_atomic(os.path.join(dist_folder, MANIFEST_NAME),
+                  json.dumps(built, indent=2, sort_keys=True).encode())
+
+    _remove_stale_builds(dist_folder, built)
+    return built
+
+
+def _remove_stale_builds(dist_folder, built):
+    """Delete fingerprinted files from earlier builds that the new manifest no longer references"""
+    keep = {MANIFEST_NAME}
+    for fingerprinted in built.values():
+        keep.update(os.path.normpath(fingerprinted + suffix) for suffix in ('', '.gz', '.br'))
+    for root, _, files in os.walk(dist_folder):
+        for name in files:
+            path = os.path.join(root, name)
+            if name.endswith(TEMP_SUFFIX):
+                continue  # another worker's build in progress
+            if os.path.relpath(path, dist_folder) not in keep:
+                os.remove(path)
+
+
+def load_manifest(static_folder):
+    """Load the asset manifest and index the precompressed variants on disk"""
+    dist_folder = os.path.join(static_folder, DIST_DIR)
+    with open(os.path.join(dist_folder, MANIFEST_NAME)) as f:
+        loaded = json.load(f)
+
+    manifest.clear()
+    manifest.update(loaded)
+    _variants.clear()
+    for fingerprinted in loaded.values():
+        path = os.path.join(dist_folder, fingerprinted)
+        variants = {'identity': path}
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if os.path.exists(path + suffix):
+                variants[encoding] = path + suffix
+        _variants[fingerprinted] = variants
+
+
+def _manifest_is_stale(static_folder):
+    """Check whether the manifest is missing or older than any source file"""
+    try:
+        built_at = os.path.getmtime(os.path.join(static_folder, DIST_DIR, MANIFEST_NAME))
+    except OSError:
+        return True
+    return any(os.path.getmtime(os.path.join(static_folder, source)) > built_at
+               for source in ASSET_SOURCES)
+
+
+def asset_url_for(endpoint, **values):
+    """Drop-in replacement for url_for that points static files at their fingerprinted copy"""
+    if endpoint == 'static' and values.get('filename') in manifest:
+        values['filename'] = manifest[values['filename']]
+        endpoint = 'asset'
+    return url_for(endpoint, **values)
+
+
+def serve_asset(filename):
+    """Serve a fingerprinted asset, preferring a precompressed variant"""
+    variants = _variants.get(filename)
+    if variants is None:
+        abort(404)
+
+    encoding = 'identity'
+    for candidate in ('br', 'gzip'):
+        if candidate in variants and request.accept_encodings[candidate]:
+            encoding = candidate
+            break
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response = send_file(variants[encoding], mimetype=mimetype,
+                         download_name=os.path.basename(filename),
+                         etag=f'{filename}-{encoding}')
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_assets(app):
+    """Register the asset route, template helper and build command on the app"""
+    app.add_url_rule('/assets/<path:filename>', 'asset', serve_asset)
+    app.add_template_global(asset_url_for)
+
+    @app.cli.command('build-assets')
+    def build_assets_command():
+        """Fingerprint and precompress static assets."""
+        built = build_assets(app.static_folder)
+        for source, fingerprinted in built.items():
+            click.echo(f'{source} -> {DIST_DIR}/{fingerprinted}')
+
+    if _manifest_is_stale(app.static_folder):
+        # No build step has run (or sources were edited since): build once at startup
+        try:
+            build_assets(app.static_folder)
+        except OSError as e:
+            logger.warning('Could not build static assets, serving unversioned files: %s', e)
+            return
+    load_manifest(app.static_folder)
@@ -2,12 +2,21 @@
 Authentication routes and session management
 """
 
-from flask import render_template, request, redirect, url_for, flash, session
-from app import app
+from functools import wraps
+
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, g
 from models import User
+from ratelimit import (rate_limited, login_ip_limiter, login_account_limiter,
+                       register_ip_limiter, login_account)
+from tasks import enqueue
+from search_cache import search_cache
 import logging
 
-@app.route('/register', methods=['GET', 'POST'])
+auth_bp = Blueprint('auth', __name__)
+logger = logging.getLogger(__name__)
+
+@auth_bp.route('/register', methods=['GET', 'POST'])
+@rate_limited(register_ip_limiter, heavy=True)
 def register():
     """User registration page"""
     if request.method == 'POST':
@@ -28,12 +37,12 @@ def register():
         
         if not username:
             errors.append('Username is required')
-        elif User.get_by_username(username):
+        elif User.username_exists(username):
             errors.append('Username already exists')
         
         if not email:
             errors.append('Email is required')
-        elif User.get_by_email(email):
+        elif User.email_exists(email):
             errors.append('Email already exists')
         
         if not password:
@@ -75,17 +84,21 @@ def register():
                 user_type=user_type
             )
             
+            search_cache.user_changed(None, user)
+            enqueue('reindex_user', user.id)
+            enqueue('roll_up_stats')
             flash('Registration successful! Please log in.', 'success')
-            logging.info(f'New user registered: {username}')
-            return redirect(url_for('login'))
+            logger.info('New user registered: %s', username)
+            return redirect(url_for('auth.login'))
             
         except Exception as e:
-            logging.error(f'Registration error: {str(e)}')
+            logger.error('Registration error: %s', e)
             flash('An error occurred during registration. Please try again.', 'error')
     
     return render_template('register.html')
 
-@app.route('/login', methods=['GET', 'POST'])
+@auth_bp.route('/login', methods=['GET', 'POST'])
+@rate_limited(login_ip_limiter, login_account_limiter, login_account, heavy=True)
 def login():
     """User login page"""
     if request.method == 'POST':
@@ -100,65 +113,70 @@ def login():
         user = User.get_by_username(username)
         
         if user and user.check_password(password) and user.is_active:
-            # Set session
+            # Set session, under a fresh id so a pre-login id cannot be reused
+            session.clear()
+            session.regenerate()
             session['user_id'] = user.id
             session['username'] = user.username
             session['user_type'] = user.user_type
             
             flash(f'Welcome back, {user.full_name}!', 'success')
-            logging.info(f'User logged in: {username}')
+            logger.info('User logged in: %s', username)
             
             # Redirect based on user type
             if user.user_type == 'admin':
-                return redirect(url_for('admin_dashboard'))
+                return redirect(url_for('admin.admin_dashboard'))
             else:
-                return redirect(url_for('dashboard'))
+                return redirect(url_for('main.dashboard'))
         else:
             flash('Invalid username or password', 'error')
-            logging.warning(f'Failed login attempt for username: {username}')
+            logger.warning('Failed login attempt for username: %s', username)
     
     return render_template('login.html')
 
-@app.route('/logout')
+@auth_bp.route('/logout')
 def logout():
     """User logout"""
     username = session.get('username', 'Unknown')
     session.clear()
+    session.regenerate()
     flash('You have been logged out successfully', 'info')
-    logging.info(f'User logged out: {username}')
-    return redirect(url_for('index'))
+    logger.info('User logged out: %s', username)
+    return redirect(url_for('main.index'))
 
 def login_required(f):
     """Decorator to require login for protected routes"""
-    from functools import wraps
-    
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
+        if not get_current_user():
             flash('Please log in to access this page', 'error')
-            return redirect(url_for('login'))
+            return redirect(url_for('auth.login'))
         return f(*args, **kwargs)
     return decorated_function
 
 def admin_required(f):
     """Decorator to require admin privileges"""
-    from functools import wraps
-    
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'user_id' not in session:
+        user = get_current_user()
+        if not user:
             flash('Please log in to access this page', 'error')
-            return redirect(url_for('login'))
+            return redirect(url_for('auth.login'))
         
-        if session.get('user_type') != 'admin':
+        if user.user_type != 'admin':
             flash('Admin privileges required', 'error')
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('main.dashboard'))
         
         return f(*args, **kwargs)
     return decorated_function
 
 def get_current_user():
-    """Get the current logged-in user"""
-    if 'user_id' in session:
-        return User.get_by_id(session['user_id'])
-    return None
+    """Get the current logged-in user, looked up once per request"""
+    if 'current_user' not in g:
+        user = User.get_by_id(session['user_id']) if 'user_id' in session else None
+        if user and not user.is_active:
+            # Deactivated since logging in
+            session.clear()
+            user = None
+        g.current_user = user
+    return g.current_user
@@ -0,0 +1,191 @@
+"""
+Typeahead index over profile names, companies, departments and locations
+"""
+
+import bisect
+import heapq
+import threading
+
+from models import User
+from tasks import task
+
+# Public field names used by the API -> User attributes they index
+FIELDS = {
+    'name': 'full_name',
+    'company': 'current_company',
+    'department': 'department',
+    'location': 'location'
+}
+
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+
+# Answers remembered per index between writes, for prefixes longer than TOP_PREFIX_LENGTH
+RESULT_CACHE_SIZE = 1024
+
+# Prefixes this short can match most of the index, so their best values are kept ranked
+# and adjusted on every write instead of being found by scanning the matching keys
+TOP_PREFIX_LENGTH = 3
+TOP_SIZE = 2 * MAX_LIMIT
+
+
+def normalize(value):
+    """Lowercase and collapse whitespace so lookups ignore case and spacing"""
+    return ' '.join((value or '').lower().split())
+
+
+class PrefixIndex:
+    """Sorted-array prefix index over distinct values, weighted by popularity"""
+
+    def __init__(self):
+        self._keys = []      # sorted (search key, normalized value) pairs
+        self._counts = {}    # normalized value -> active profiles using it
+        self._display = {}   # normalized value -> value as first entered
+        self._results = {}   # prefix -> {limit: suggestions}; writes drop the prefixes they affect
+        self._top = {}       # short prefix -> [best values in rank order, whether that is all of them]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _search_keys(normalized):
+        """Every word-suffix of a value, so 'smith' finds 'John Smith'"""
+        words = normalized.split(' ')
+        return [' '.join(words[i:]) for i in range(len(words))]
+
+    def _rank(self, value):
+        """Sort key: most used first, then alphabetically"""
+        return (-self._counts[value], value)
+
+    def _changed(self, normalized, increased):
+        """Drop cached answers and re-rank the short-prefix lists after a count change"""
+        keys = self._search_keys(normalized)
+        for key in keys:
+            for end in range(TOP_PREFIX_LENGTH + 1, len(key) + 1):
+                self._results.pop(key[:end], None)
+
+        count = self._counts.get(normalized, 0)
+        prefixes = {key[:end] for key in keys for end in range(1, min(len(key), TOP_PREFIX_LENGTH) + 1)}
+        for prefix in prefixes:
+            entry = self._top.get(prefix)
+            if entry is None:
+                continue  # ranked on first use
+            values, complete = entry
+            # Each list holds exactly the best len(values) matches, so every value missing
+            # from it ranks below its last one; keep that true
+            listed = normalized in values
+            if listed:
+                values.remove(normalized)
+            if count and (complete or (listed and increased) or
+                          (values and self._rank(normalized) < self._rank(values[-1]))):
+                bisect.insort(values, normalized, key=self._rank)
+                if len(values) > TOP_SIZE:
+                    values.pop()
+                    entry[1] = False
+
+    def _matches(self, prefix):
+        """Distinct values with a search key starting with ``prefix``"""
+        low = bisect.bisect_left(self._keys, (prefix,))
+        high = bisect.bisect_left(self._keys, (prefix + '\uffff',))
+        return {value for _, value in self._keys[low:high]}
+
+    def add(self, value):
+        """Count one more profile using ``value``"""
+        normalized = normalize(value)
+        if not normalized:
+            return
+        with self._lock:
+            count = self._counts.get(normalized, 0)
+            if not count:
+                self._display[normalized] = value.strip()
+                for key in self._search_keys(normalized):
+                    bisect.insort(self._keys, (key, normalized))
+            self._counts[normalized] = count + 1
+            self._changed(normalized, increased=True)
+
+    def remove(self, value):
+        """Count one fewer profile using ``value``, dropping it when unused"""
+        normalized = normalize(value)
+        with self._lock:
+            count = self._counts.get(normalized, 0)
+            if not count:
+                return
+            if count > 1:
+                self._counts[normalized] = count - 1
+            else:
+                del self._counts[normalized]
+                del self._display[normalized]
+                for key in self._search_keys(normalized):
+                    position = bisect.bisect_left(self._keys, (key, normalized))
+                    if position < len(self._keys) and self._keys[position] == (key, normalized):
+                        del self._keys[position]
+            self._changed(normalized, increased=False)
+
+    def _top_values(self, prefix, limit):
+        """Best values for a short prefix, re-ranking the full match list only when too few are known"""
+        entry = self._top.get(prefix)
+        if entry is None or (len(entry[0]) < limit and not entry[1]):
+            matches = self._matches(prefix)
+            entry = self._top[prefix] = [heapq.nsmallest(TOP_SIZE, matches, key=self._rank),
+                                         len(matches) <= TOP_SIZE]
+        return entry[0][:limit]
+
+    def complete(self, prefix, limit=DEFAULT_LIMIT):
+        """Most popular values with a word starting with ``prefix``"""
+        normalized = normalize(prefix)
+        if not normalized:
+            return []
+        with self._lock:
+            if len(normalized) <= TOP_PREFIX_LENGTH:
+                return [self._display[value] for value in self._top_values(normalized, limit)]
+            cached = self._results.get(normalized, {}).get(limit)
+            if cached is not None:
+                return cached
+            best = heapq.nsmallest(limit, self._matches(normalized), key=self._rank)
+            suggestions = [self._display[value] for value in best]
+            if len(self._results) >= RESULT_CACHE_SIZE:
+                self._results.clear()
+            self._results.setdefault(normalized, {})[limit] = suggestions
+            return suggestions
+
+    def values(self):
+        """All distinct values, alphabetically"""
+        with self._lock:
+            return [self._display[value] for value in sorted(self._display)]
+
+
+indexes = {field: PrefixIndex() for field in FIELDS}
+
+# User id -> the field values currently counted for that user
+_indexed_users = {}
+_lock = threading.Lock()
+
+
+def update_user(user):
+    """Bring the indexes in line with a user's current profile and status"""
+    with _lock:
+        for field, value in _indexed_users.pop(user.id, {}).items():
+            indexes[field].remove(value)
+        if user.is_active:
+            values = {field: getattr(user, attribute) for field, attribute in FIELDS.items()
+                      if getattr(user, attribute)}
+            for field, value in values.items():
+                indexes[field].add(value)
+            _indexed_users[user.id] = values
+
+
+@task('reindex_user')
+def reindex_user(user_id):
+    """Background task: re-index one user after a profile or status change"""
+    user = User.get_by_id(user_id)
+    if user:
+        update_user(user)
+
+
+def complete(field, prefix, limit=DEFAULT_LIMIT):
+    """Suggestions for a public field name"""
+    return indexes[field].complete(prefix, max(1, min(limit, MAX_LIMIT)))
+
+
+def build_indexes():
+    """Index every existing user"""
+    for user in User.get_all_users():
+        update_user(user)
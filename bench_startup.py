@@ -0,0 +1,64 @@
+"""
+Startup-time benchmark for worker boot and test processes
+
+Each run starts a fresh interpreter and measures how long it takes to import
+the app module, build the application and answer a first request.
+
+Usage: python bench_startup.py [--runs N] [--max-ms MS]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Runs inside a fresh interpreter so nothing is cached between samples
+PROBE = '''
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app({'TESTING': True})
+created = time.perf_counter()
+application.test_client().get('/')
+served = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (served - created) * 1000,
+    'total_ms': (served - start) * 1000,
+}))
+'''
+
+def run_probe():
+    """Start one interpreter and return its timings"""
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure application startup time')
+    parser.add_argument('--runs', type=int, default=5, help='number of fresh interpreters to start')
+    parser.add_argument('--max-ms', type=float, default=None,
+                        help='fail if the median total startup time exceeds this many milliseconds')
+    args = parser.parse_args()
+
+    samples = [run_probe() for _ in range(args.runs)]
+
+    print(f'{"phase":<18}{"median ms":>12}{"max ms":>12}')
+    for phase in ('import_ms', 'create_app_ms', 'first_request_ms', 'total_ms'):
+        values = [sample[phase] for sample in samples]
+        print(f'{phase[:-3]:<18}{statistics.median(values):>12.1f}{max(values):>12.1f}')
+
+    median_total = statistics.median(sample['total_ms'] for sample in samples)
+    if args.max_ms is not None and median_total > args.max_ms:
+        print(f'Startup too slow: {median_total:.1f} ms > {args.max_ms:.1f} ms')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Template caching: on-disk Jinja bytecode and in-process rendered fragments
+"""
+
+from collections import OrderedDict
+import os
+import threading
+
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+
+import models
+
+DEFAULT_MAX_ENTRIES = 2048
+
+
+class FragmentCache:
+    """Least-recently-used map from fragment keys to rendered markup"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Rendered markup for ``key``, or None"""
+        with self._lock:
+            markup = self._entries.get(key)
+            if markup is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return markup
+
+    def put(self, key, markup):
+        """Store a rendered fragment, evicting the least recently used one when full"""
+        with self._lock:
+            self._entries[key] = markup
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+fragment_cache = FragmentCache()
+
+
+class FragmentCacheExtension(Extension):
+    """``{% cache 'name', part, ... %}...{% endcache %}`` renders the body once per key.
+
+    Keys never expire; they should include the version of everything the body
+    shows, so a change produces a new key and the old entry ages out of the LRU.
+    """
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        key = nodes.Tuple(parts, 'load')
+        return nodes.CallBlock(self.call_method('_render', [key]), [], [], body).set_lineno(lineno)
+
+    def _render(self, key, caller):
+        markup = fragment_cache.get(key)
+        if markup is None:
+            markup = caller()
+            fragment_cache.put(key, markup)
+        return markup
+
+
+def user_version(user_id):
+    """Version of a user in the hot store, for keys of fragments showing their name"""
+    user = models.users.get(user_id)
+    return user.version if user else None
+
+
+def inbox_version(user_id):
+    """Version of a user's inbox, bumped whenever one of their conversations changes"""
+    return models.inbox_versions.get(user_id, 0)
+
+
+def versions_of(objects, *user_attrs):
+    """(id, version) of each object, plus the versions of the users it names through ``user_attrs``"""
+    return tuple((obj.id, obj.version) + tuple(user_version(getattr(obj, attr)) for attr in user_attrs)
+                 for obj in objects)
+
+
+def unread_message_count(user_id):
+    """Unread messages for the navigation badge"""
+    return models.Conversation.get_unread_count(user_id)
+
+
+def init_templates(app):
+    """Enable the bytecode cache and the ``{% cache %}`` tag, and register the key helpers"""
+    # Compiled templates are shared by every worker, so only the first one to load
+    # a template pays for compiling it; entries are keyed on the template source
+    directory = app.config.get('TEMPLATE_CACHE_DIR', os.environ.get('TEMPLATE_CACHE_DIR'))
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+    app.jinja_env.add_extension(FragmentCacheExtension)
+
+    for helper in (user_version, inbox_version, versions_of, unread_message_count):
+        app.add_template_global(helper)
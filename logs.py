@@ -0,0 +1,147 @@
+"""
+Asynchronous, structured logging kept off the request path
+"""
+
+from datetime import datetime, timezone
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+
+from flask import g, has_request_context, request
+
+ACCESS_LOGGER = 'alumni.access'
+
+# Fraction of records kept per logger; warnings and errors are never sampled out
+DEFAULT_SAMPLE_RATES = {ACCESS_LOGGER: 0.1}
+
+# Requests slower than this are always logged, at WARNING level
+SLOW_REQUEST_MS = 500
+
+# Records waiting for the writer thread; beyond this they are dropped, not blocked on
+QUEUE_SIZE = 10000
+
+# Attributes every LogRecord has; anything else was passed through ``extra``
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+access_logger = logging.getLogger(ACCESS_LOGGER)
+
+_listener = None
+
+
+class RequestContextFilter(logging.Filter):
+    """Attach the id of the request being handled to each record"""
+
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = g.get('request_id') if has_request_context() else None
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of records from high-volume loggers"""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(record.name, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that leaves all formatting to the background writer"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # The stock handler formats here, in the request thread; the writer does it instead
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JSONFormatter(logging.Formatter):
+    """Render each record as one JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def _start_listener(level, sample_rates):
+    """Route the root logger through a queue drained by a background writer thread"""
+    global _listener
+
+    log_queue = queue.Queue(QUEUE_SIZE)
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_rates))
+    queue_handler.addFilter(RequestContextFilter())
+
+    writer = logging.StreamHandler(sys.stderr)
+    writer.setFormatter(JSONFormatter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, writer)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def _begin_request():
+    """Assign a request id and start the request timer"""
+    g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+    g.request_start = time.perf_counter()
+
+
+def _log_request(response):
+    """Emit a (sampled) access record with the request timing"""
+    start = g.get('request_start')
+    if start is None:
+        return response
+    duration_ms = (time.perf_counter() - start) * 1000
+    level = logging.WARNING if duration_ms > SLOW_REQUEST_MS else logging.INFO
+    access_logger.log(level, '%s %s %s', request.method, request.path, response.status_code,
+                      extra={'method': request.method, 'path': request.path,
+                             'status': response.status_code,
+                             'duration_ms': round(duration_ms, 2)})
+    response.headers['X-Request-ID'] = g.request_id
+    return response
+
+
+def init_logging(app):
+    """Set up the logging subsystem and per-request ids and timings for the app"""
+    if _listener is None:
+        level = os.environ.get('LOG_LEVEL', 'INFO').upper()
+        sample_rates = dict(DEFAULT_SAMPLE_RATES, **app.config.get('LOG_SAMPLE_RATES', {}))
+        _start_listener(level, sample_rates)
+
+    app.before_request(_begin_request)
+    app.after_request(_log_request)
@@ -4,24 +4,107 @@ Using in-memory storage for MVP implementation
 """
 
 from datetime import datetime
+from itertools import islice
 from werkzeug.security import generate_password_hash, check_password_hash
+import heapq
+import logging
+import os
+import threading
 import uuid
 
+logger = logging.getLogger(__name__)
+
 # In-memory storage dictionaries
 users = {}
 jobs = {}
 events = {}
 messages = {}
+conversations = {}
+
+# Conversation lookups: participant pair -> conversation id, user id -> conversation ids
+conversation_index = {}
+user_conversations = {}
+# Serializes starting conversations, so two first messages between a pair share one
+_conversation_lock = threading.Lock()
+
+# Per-user inbox version, bumped whenever one of the user's conversations changes
+inbox_versions = {}
+
+# Hot stores by collection name. The cold-tier sweep removes entries on a task thread,
+# so loops over a store iterate a snapshot (list(d.values()) copies atomically)
+stores = {
+    'users': users,
+    'jobs': jobs,
+    'events': events,
+    'messages': messages
+}
+
+# Cold tier for inactive and aged records (a tiering.SegmentStore, set up by init_tiering)
+cold_store = None
+
+def archived(collection):
+    """Summaries of a collection's records in the cold tier"""
+    return cold_store.summaries(collection) if cold_store is not None else []
+
+def archived_count(collection):
+    """Number of a collection's records in the cold tier"""
+    return cold_store.count(collection) if cold_store is not None else 0
+
+def archived_summary(collection, object_id):
+    """Summary of an archived record, read without restoring it"""
+    return cold_store.summary(collection, object_id) if cold_store is not None else None
+
+def fault_in(collection, object_id):
+    """Bring an archived record back from the cold tier into its hot store"""
+    if cold_store is None or not object_id:
+        return None
+    try:
+        return cold_store.restore(collection, object_id, stores[collection])
+    except Exception:
+        # The record stays archived; callers treat it as not found
+        logger.exception('Could not restore %s %s from cold storage', collection, object_id)
+        return None
+
+# Per-collection version counters, bumped whenever an object is created or modified
+versions = {
+    'users': 0,
+    'jobs': 0,
+    'events': 0,
+    'messages': 0
+}
+
+def bump_version(collection):
+    """Record that something in a collection changed"""
+    versions[collection] += 1
+
+class Versioned:
+    """Mixin giving each object a version number that changes on every update"""
+    
+    collection = None
+    version = 0
+    
+    def touch(self):
+        """Mark this object (and its collection) as modified"""
+        self.version += 1
+        self.updated_at = datetime.now()
+        if cold_store is not None and self.collection in stores and stores[self.collection].get(self.id) is not self:
+            # A request may still hold an object the sweep has just archived
+            cold_store.reinstate(self.collection, self, stores[self.collection])
+        bump_version(self.collection)
 
-class User:
+class User(Versioned):
     """User model for alumni and students"""
     
+    collection = 'users'
+    
     def __init__(self, username, email, password, full_name, graduation_year=None, 
-                 department=None, current_company=None, location=None, user_type='alumni'):
+                 department=None, current_company=None, location=None, user_type='alumni',
+                 password_hash=None):
         self.id = str(uuid.uuid4())
         self.username = username
         self.email = email
-        self.password_hash = generate_password_hash(password)
+        # A precomputed hash skips the (deliberately slow) key derivation
+        self.password_hash = password_hash or generate_password_hash(password)
         self.full_name = full_name
         self.graduation_year = graduation_year
         self.department = department
@@ -33,6 +116,7 @@ class User:
         
         # Store in global users dictionary
         users[self.id] = self
+        self.touch()
     
     def check_password(self, password):
         """Check if provided password matches the stored hash"""
@@ -56,33 +140,63 @@ class User:
     
     @staticmethod
     def get_by_username(username):
-        """Find user by username"""
-        for user in users.values():
+        """Find user by username (archived users are inactive and cannot sign in, so they are not loaded)"""
+        for user in list(users.values()):
             if user.username == username:
                 return user
         return None
     
     @staticmethod
     def get_by_email(email):
-        """Find user by email"""
-        for user in users.values():
+        """Find user by email (archived users are not loaded)"""
+        for user in list(users.values()):
             if user.email == email:
                 return user
         return None
     
+    @staticmethod
+    def username_exists(username):
+        """Whether a username is taken, without loading an archived user back into memory"""
+        if any(user.username == username for user in list(users.values())):
+            return True
+        return cold_store is not None and cold_store.find('users', 'username', username) is not None
+    
+    @staticmethod
+    def email_exists(email):
+        """Whether an email is taken, without loading an archived user back into memory"""
+        if any(user.email == email for user in list(users.values())):
+            return True
+        return cold_store is not None and cold_store.find('users', 'email', email) is not None
+    
     @staticmethod
     def get_by_id(user_id):
         """Find user by ID"""
+        return users.get(user_id) or fault_in('users', user_id)
+    
+    @staticmethod
+    def get_resident(user_id):
+        """Find a user held in memory, leaving an archived one in the cold tier"""
         return users.get(user_id)
     
+    @staticmethod
+    def get_name(user_id):
+        """Full name of a user, read from the cold summary if archived, or None"""
+        user = users.get(user_id)
+        if user:
+            return user.full_name
+        summary = archived_summary('users', user_id)
+        return summary['full_name'] if summary else None
+    
     @staticmethod
     def get_all_users():
-        """Get all users"""
+        """Get all users held in memory (archived users are not included)"""
         return list(users.values())
 
-class Job:
+class Job(Versioned):
     """Job posting model"""
     
+    collection = 'jobs'
+    
     def __init__(self, title, description, company, location, posted_by_id, 
                  job_type='full-time', salary_range=None):
         self.id = str(uuid.uuid4())
@@ -98,17 +212,18 @@ class Job:
         
         # Store in global jobs dictionary
         jobs[self.id] = self
+        self.touch()
     
     def to_dict(self):
         """Convert job object to dictionary"""
-        posted_by = User.get_by_id(self.posted_by_id)
+        posted_by = User.get_name(self.posted_by_id)
         return {
             'id': self.id,
             'title': self.title,
             'description': self.description,
             'company': self.company,
             'location': self.location,
-            'posted_by': posted_by.full_name if posted_by else 'Unknown',
+            'posted_by': posted_by or 'Unknown',
             'posted_by_id': self.posted_by_id,
             'job_type': self.job_type,
             'salary_range': self.salary_range,
@@ -117,18 +232,20 @@ class Job:
         }
     
     @staticmethod
-    def get_all_jobs():
-        """Get all active jobs"""
-        return [job for job in jobs.values() if job.is_active]
+    def get_all_jobs(include_inactive=False):
+        """Get all active jobs (or every job held in memory)"""
+        return [job for job in list(jobs.values()) if include_inactive or job.is_active]
     
     @staticmethod
     def get_by_id(job_id):
         """Find job by ID"""
-        return jobs.get(job_id)
+        return jobs.get(job_id) or fault_in('jobs', job_id)
 
-class Event:
+class Event(Versioned):
     """Event model for alumni gatherings and networking events"""
     
+    collection = 'events'
+    
     def __init__(self, title, description, date, location, organized_by_id):
         self.id = str(uuid.uuid4())
         self.title = title
@@ -141,35 +258,156 @@ class Event:
         
         # Store in global events dictionary
         events[self.id] = self
+        self.touch()
     
     def to_dict(self):
         """Convert event object to dictionary"""
-        organized_by = User.get_by_id(self.organized_by_id)
+        organized_by = User.get_name(self.organized_by_id)
         return {
             'id': self.id,
             'title': self.title,
             'description': self.description,
             'date': self.date,
             'location': self.location,
-            'organized_by': organized_by.full_name if organized_by else 'Unknown',
+            'organized_by': organized_by or 'Unknown',
             'organized_by_id': self.organized_by_id,
             'created_at': self.created_at,
             'is_active': self.is_active
         }
     
     @staticmethod
-    def get_all_events():
-        """Get all active events"""
-        return [event for event in events.values() if event.is_active]
+    def get_all_events(include_inactive=False):
+        """Get all active events (or every event held in memory)"""
+        return [event for event in list(events.values()) if include_inactive or event.is_active]
     
     @staticmethod
     def get_by_id(event_id):
         """Find event by ID"""
-        return events.get(event_id)
+        return events.get(event_id) or fault_in('events', event_id)
+
+# Characters of the newest message shown in the inbox
+PREVIEW_LENGTH = 100
 
-class Message:
+class Conversation(Versioned):
+    """Thread of messages between two participants, stored in time order"""
+    
+    collection = 'messages'
+    
+    def __init__(self, participant_ids):
+        self.id = str(uuid.uuid4())
+        self.participant_ids = tuple(sorted(participant_ids))
+        self.entries = []  # (created_at, message_id), oldest first
+        # Summary of the newest message, kept at write time so the inbox never loads messages
+        self.last_message_id = None
+        self.last_message_at = None
+        self.last_sender_id = None
+        self.last_subject = None
+        self.last_preview = None
+        self.unread_counts = {user_id: 0 for user_id in self.participant_ids}
+        self.created_at = datetime.now()
+        
+        # Store in global conversations dictionary and lookup indexes
+        conversations[self.id] = self
+        conversation_index[frozenset(self.participant_ids)] = self.id
+        for user_id in self.participant_ids:
+            user_conversations.setdefault(user_id, set()).add(self.id)
+        self.touch()
+    
+    def touch(self):
+        """Mark this conversation, and the participants' inboxes, as modified"""
+        super().touch()
+        for user_id in self.participant_ids:
+            inbox_versions[user_id] = inbox_versions.get(user_id, 0) + 1
+    
+    def add_message(self, message):
+        """Append a message and update the summaries kept for the inbox"""
+        self.entries.append((message.created_at, message.id))
+        self.last_message_id = message.id
+        self.last_message_at = message.created_at
+        self.last_sender_id = message.sender_id
+        self.last_subject = message.subject
+        content = message.content
+        self.last_preview = content if len(content) <= PREVIEW_LENGTH else content[:PREVIEW_LENGTH] + '...'
+        self.unread_counts[message.receiver_id] += 1
+        self.touch()
+    
+    def mark_read(self, user_id):
+        """Mark every message received by the user as read"""
+        remaining = self.unread_counts.get(user_id, 0)
+        # Unread messages are almost always the newest ones, so walk backwards
+        for _, message_id in reversed(self.entries):
+            if not remaining:
+                break
+            message = messages.get(message_id)  # only read messages are ever archived
+            if message and message.receiver_id == user_id and not message.is_read:
+                message.is_read = True
+                message.touch()
+                remaining -= 1
+        if self.unread_counts.get(user_id):
+            self.unread_counts[user_id] = 0
+            self.touch()
+    
+    def get_page(self, before=None, limit=20):
+        """Get up to ``limit`` messages before position ``before``, oldest first"""
+        # Also returns the cursor for the next older page, or None at the start of the thread
+        end = len(self.entries) if before is None else max(0, min(before, len(self.entries)))
+        start = max(0, end - limit)
+        page = [Message.get_by_id(message_id) for _, message_id in self.entries[start:end]]
+        return [message for message in page if message], (start or None)
+    
+    def other_participant_id(self, user_id):
+        """ID of the participant who is not ``user_id``"""
+        for participant_id in self.participant_ids:
+            if participant_id != user_id:
+                return participant_id
+        return user_id
+    
+    def other_participant_name(self, user_id):
+        """Name of the participant who is not ``user_id``"""
+        return User.get_name(self.other_participant_id(user_id))
+    
+    def unread_for(self, user_id):
+        """Number of unread messages the user has in this conversation"""
+        return self.unread_counts.get(user_id, 0)
+    
+    @staticmethod
+    def get_between(user_id, other_id):
+        """Find the conversation between two users"""
+        conversation_id = conversation_index.get(frozenset((user_id, other_id)))
+        return conversations.get(conversation_id) if conversation_id else None
+    
+    @staticmethod
+    def get_or_create(user_id, other_id):
+        """Find the conversation between two users, starting one if needed"""
+        conversation = Conversation.get_between(user_id, other_id)
+        if conversation:
+            return conversation
+        with _conversation_lock:
+            return Conversation.get_between(user_id, other_id) or Conversation((user_id, other_id))
+    
+    @staticmethod
+    def get_for_user(user_id):
+        """Get a user's conversations, most recently active first"""
+        user_threads = [conversations[conversation_id]
+                        for conversation_id in user_conversations.get(user_id, ())]
+        return sorted(user_threads, key=lambda x: x.last_message_at or x.created_at, reverse=True)
+    
+    @staticmethod
+    def get_unread_count(user_id):
+        """Total unread messages across a user's conversations"""
+        return sum(conversations[conversation_id].unread_for(user_id)
+                   for conversation_id in user_conversations.get(user_id, ()))
+    
+    @staticmethod
+    def get_by_id(conversation_id):
+        """Find conversation by ID"""
+        return conversations.get(conversation_id)
+
+class Message(Versioned):
     """Message model for user communication"""
     
+    collection = 'messages'
+    
     def __init__(self, sender_id, receiver_id, subject, content):
         self.id = str(uuid.uuid4())
         self.sender_id = sender_id
@@ -179,18 +417,23 @@ class Message:
         self.created_at = datetime.now()
         self.is_read = False
         
-        # Store in global messages dictionary
+        # Store in global messages dictionary and append to the conversation thread
         messages[self.id] = self
+        self.touch()
+        conversation = Conversation.get_or_create(sender_id, receiver_id)
+        self.thread_id = conversation.id
+        conversation.add_message(self)
     
     def to_dict(self):
         """Convert message object to dictionary"""
-        sender = User.get_by_id(self.sender_id)
-        receiver = User.get_by_id(self.receiver_id)
+        sender = User.get_name(self.sender_id)
+        receiver = User.get_name(self.receiver_id)
         return {
             'id': self.id,
-            'sender': sender.full_name if sender else 'Unknown',
+            'thread_id': self.thread_id,
+            'sender': sender or 'Unknown',
             'sender_id': self.sender_id,
-            'receiver': receiver.full_name if receiver else 'Unknown',
+            'receiver': receiver or 'Unknown',
             'receiver_id': self.receiver_id,
             'subject': self.subject,
             'content': self.content,
@@ -198,19 +441,41 @@ class Message:
             'is_read': self.is_read
         }
     
+    def mark_read(self):
+        """Mark the message as read by its receiver"""
+        if self.is_read:
+            return
+        self.is_read = True
+        self.touch()
+        conversation = Conversation.get_by_id(self.thread_id)
+        if conversation and conversation.unread_counts.get(self.receiver_id):
+            conversation.unread_counts[self.receiver_id] -= 1
+            conversation.touch()
+    
     @staticmethod
-    def get_user_messages(user_id):
-        """Get all messages for a specific user (sent and received)"""
-        user_messages = []
-        for message in messages.values():
-            if message.sender_id == user_id or message.receiver_id == user_id:
-                user_messages.append(message)
-        return sorted(user_messages, key=lambda x: x.created_at, reverse=True)
+    def get_user_messages(user_id, limit=None):
+        """Get messages for a specific user (sent and received), newest first"""
+        # Merge the per-conversation threads instead of scanning every message
+        threads = [reversed(conversations[conversation_id].entries)
+                   for conversation_id in user_conversations.get(user_id, ())]
+        entries = heapq.merge(*threads, reverse=True)
+        # Archived messages (old and already read) are left in the cold tier
+        user_messages = (messages.get(message_id) for _, message_id in entries)
+        user_messages = (message for message in user_messages if message)
+        return list(islice(user_messages, limit))
     
     @staticmethod
     def get_by_id(message_id):
         """Find message by ID"""
-        return messages.get(message_id)
+        return messages.get(message_id) or fault_in('messages', message_id)
+
+# Precomputed hash of the default admin password ('admin123'), so seeding
+# the admin does not pay for a full key derivation on every worker start
+ADMIN_PASSWORD_HASH = os.environ.get(
+    'ADMIN_PASSWORD_HASH',
+    'scrypt:32768:8:1$W4e0YSvWQIyqcE6D$e90ff99b50132a58ae6cf73178566d5dd75b5cf41613f1cf'
+    '483a02d67dd82f3a0191ca0db0ce31287093af4ea3f6d28023aad06aa82c64037d13bb2d3886a16d'
+)
 
 # Initialize with admin user
 def init_data():
@@ -219,11 +484,9 @@ def init_data():
         admin = User(
             username='admin',
             email='admin@alumni.edu',
-            password='admin123',
+            password=None,
             full_name='System Administrator',
-            user_type='admin'
+            user_type='admin',
+            password_hash=ADMIN_PASSWORD_HASH
         )
-        print(f"Admin user created with ID: {admin.id}")
-
-# Call initialization
-init_data()
+        logger.info('Admin user created with ID: %s', admin.id)
@@ -0,0 +1,136 @@
+"""
+In-process rate limiting and load shedding for expensive endpoints
+"""
+
+from collections import OrderedDict
+from functools import wraps
+import math
+import os
+import threading
+import time
+
+from flask import request, session
+from werkzeug.exceptions import TooManyRequests
+
+
+class TokenBucket:
+    """Bucket holding up to ``capacity`` tokens, refilled continuously"""
+
+    __slots__ = ('tokens', 'updated_at')
+
+    def __init__(self, capacity, now):
+        self.tokens = capacity
+        self.updated_at = now
+
+    def take(self, cost, rate, capacity, now):
+        """Take ``cost`` tokens; returns 0 on success, else seconds until they are available"""
+        self.tokens = min(capacity, self.tokens + (now - self.updated_at) * rate)
+        self.updated_at = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0
+        return (cost - self.tokens) / rate
+
+
+class RateLimiter:
+    """Token buckets per key, bounded in memory by least-recently-used eviction"""
+
+    def __init__(self, rate, capacity, max_keys=10000):
+        self.rate = rate  # tokens per second
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self.rejected = 0
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, cost=1):
+        """Record a request for ``key``; returns 0 if allowed, else seconds to wait"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.capacity, now)
+                if len(self._buckets) > self.max_keys:
+                    # Idle keys are the oldest, and their buckets would have refilled anyway
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            wait = bucket.take(cost, self.rate, self.capacity, now)
+            if wait:
+                self.rejected += 1
+            return wait
+
+    def refund(self, key, cost=1):
+        """Give back tokens taken by an allowed hit, e.g. when a later check rejected the request"""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.tokens = min(self.capacity, bucket.tokens + cost)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+def per_minute(count, burst=None):
+    """Limiter allowing ``count`` requests a minute, with bursts up to ``burst``"""
+    return RateLimiter(rate=count / 60.0, capacity=burst or count)
+
+
+# Per-IP and per-account limits for the endpoints that hash passwords or create messages
+login_ip_limiter = per_minute(20)
+login_account_limiter = per_minute(5)
+register_ip_limiter = per_minute(5)
+message_ip_limiter = per_minute(60)
+message_account_limiter = per_minute(20)
+
+# Process-wide budget for CPU-heavy work (password hashing); beyond it requests are shed
+heavy_work_limiter = RateLimiter(
+    rate=float(os.environ.get('HEAVY_WORK_PER_SECOND', 20)),
+    capacity=float(os.environ.get('HEAVY_WORK_BURST', 40)),
+    max_keys=1
+)
+
+
+def client_ip():
+    """Address of the client (ProxyFix has already applied X-Forwarded-For)"""
+    return request.remote_addr or 'unknown'
+
+
+def login_account():
+    """Account key for login attempts: the submitted username"""
+    return request.form.get('username', '').strip().lower() or None
+
+
+def session_account():
+    """Account key for signed-in actions: the session's user id"""
+    return session.get('user_id')
+
+
+def rate_limited(ip_limiter, account_limiter=None, account_key=None, heavy=False):
+    """Decorator rejecting POSTs over the per-IP, per-account or global heavy-work budget with 429"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if request.method != 'POST':
+                return f(*args, **kwargs)
+
+            checks = [(ip_limiter, client_ip())]
+            if account_limiter is not None:
+                key = account_key()
+                if key:
+                    checks.append((account_limiter, key))
+            # Checked last so one abusive client is stopped before it spends the shared budget
+            if heavy:
+                checks.append((heavy_work_limiter, 'global'))
+
+            for position, (limiter, key) in enumerate(checks):
+                wait = limiter.hit(key)
+                if wait:
+                    # A rejected request must not spend the budgets it already passed
+                    for passed_limiter, passed_key in checks[:position]:
+                        passed_limiter.refund(passed_key)
+                    raise TooManyRequests(retry_after=math.ceil(wait))
+
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
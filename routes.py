@@ -2,14 +2,21 @@
 Main application routes
 """
 
-from flask import render_template, request, redirect, url_for, flash, session
-from app import app
-from models import User, Job, Event, Message
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, abort
+from models import User, Job, Event, Message, Conversation, versions, inbox_versions
 from auth import login_required, get_current_user
-from datetime import datetime
+from http_cache import conditional
+from tasks import enqueue
+import autocomplete
+from search_cache import search_cache, normalize_filters, search_fields, matches
+from ratelimit import rate_limited, message_ip_limiter, message_account_limiter, session_account
+from datetime import date, datetime
 import logging
 
-@app.route('/')
+main_bp = Blueprint('main', __name__)
+logger = logging.getLogger(__name__)
+
+@main_bp.route('/')
 def index():
     """Home page"""
     # Get recent jobs and events for display
@@ -20,18 +27,18 @@ def index():
                          recent_jobs=recent_jobs, 
                          recent_events=recent_events)
 
-@app.route('/dashboard')
+@main_bp.route('/dashboard')
 @login_required
 def dashboard():
     """User dashboard"""
     current_user = get_current_user()
     if not current_user:
-        return redirect(url_for('login'))
+        return redirect(url_for('auth.login'))
     
     # Get user's recent activity
     user_jobs = [job for job in Job.get_all_jobs() if job.posted_by_id == current_user.id]
     user_events = [event for event in Event.get_all_events() if event.organized_by_id == current_user.id]
-    user_messages = Message.get_user_messages(current_user.id)[:5]  # Recent 5 messages
+    user_messages = Message.get_user_messages(current_user.id, limit=5)  # Recent 5 messages
     
     return render_template('dashboard.html',
                          user=current_user,
@@ -39,29 +46,37 @@ def dashboard():
                          user_events=user_events,
                          user_messages=user_messages)
 
-@app.route('/profile/<user_id>')
+def _profile_validator(user_id):
+    """Validator for a profile page: the profile owner's version"""
+    user = User.get_resident(user_id)
+    return (user.id, user.version) if user else None
+
+@main_bp.route('/profile/<user_id>')
 @login_required
+@conditional(_profile_validator)
 def profile(user_id):
     """View user profile"""
     user = User.get_by_id(user_id)
     if not user:
         flash('User not found', 'error')
-        return redirect(url_for('search'))
+        return redirect(url_for('main.search'))
     
     current_user = get_current_user()
     is_own_profile = current_user and current_user.id == user_id
     
     return render_template('profile.html', user=user, is_own_profile=is_own_profile)
 
-@app.route('/edit_profile', methods=['GET', 'POST'])
+@main_bp.route('/edit_profile', methods=['GET', 'POST'])
 @login_required
 def edit_profile():
     """Edit user profile"""
     current_user = get_current_user()
     if not current_user:
-        return redirect(url_for('login'))
+        return redirect(url_for('auth.login'))
     
     if request.method == 'POST':
+        before = search_fields(current_user)
+        
         # Update profile information
         current_user.full_name = request.form.get('full_name', '').strip()
         current_user.department = request.form.get('department', '').strip()
@@ -75,21 +90,27 @@ def edit_profile():
                 current_user.graduation_year = int(graduation_year)
             except ValueError:
                 flash('Invalid graduation year', 'error')
+                current_user.touch()
+                search_cache.user_changed(before, current_user)
+                enqueue('reindex_user', current_user.id)
                 return render_template('edit_profile.html', user=current_user)
         
+        current_user.touch()
+        search_cache.user_changed(before, current_user)
+        enqueue('reindex_user', current_user.id)
         flash('Profile updated successfully!', 'success')
-        logging.info(f'Profile updated for user: {current_user.username}')
-        return redirect(url_for('profile', user_id=current_user.id))
+        logger.info('Profile updated for user: %s', current_user.username)
+        return redirect(url_for('main.profile', user_id=current_user.id))
     
     return render_template('edit_profile.html', user=current_user)
 
-@app.route('/search')
+@main_bp.route('/search')
 @login_required
 def search():
     """Search and filter alumni"""
     current_user = get_current_user()
     if not current_user:
-        return redirect(url_for('login'))
+        return redirect(url_for('auth.login'))
     
     # Get search parameters
     query = request.args.get('q', '').strip()
@@ -97,44 +118,22 @@ def search():
     company = request.args.get('company', '').strip()
     graduation_year = request.args.get('graduation_year', '').strip()
     
-    # Get all users except current user
-    all_users = [user for user in User.get_all_users() 
-                 if user.id != current_user.id and user.is_active]
-    
-    # Apply filters
-    filtered_users = all_users
-    
-    if query:
-        filtered_users = [user for user in filtered_users 
-                         if query.lower() in user.full_name.lower() or
-                            query.lower() in (user.username or '').lower()]
-    
-    if department:
-        filtered_users = [user for user in filtered_users 
-                         if user.department and department.lower() in user.department.lower()]
+    # Results are shared between viewers, so the viewer is only excluded after the lookup
+    key = normalize_filters(query, department, company, graduation_year)
+    user_ids = search_cache.get(key)
+    if user_ids is None:
+        generation = search_cache.generation
+        user_ids = [user.id for user in User.get_all_users() if matches(key, search_fields(user))]
+        search_cache.put(key, user_ids, generation)
     
-    if company:
-        filtered_users = [user for user in filtered_users 
-                         if user.current_company and company.lower() in user.current_company.lower()]
+    filtered_users = [User.get_by_id(user_id) for user_id in user_ids if user_id != current_user.id]
     
-    if graduation_year:
-        try:
-            year = int(graduation_year)
-            filtered_users = [user for user in filtered_users 
-                             if user.graduation_year == year]
-        except ValueError:
-            pass
-    
-    # Get unique departments and companies for filter dropdowns
-    departments = list(set([user.department for user in all_users 
-                           if user.department]))
-    companies = list(set([user.current_company for user in all_users 
-                         if user.current_company]))
+    # Department dropdown comes from the autocomplete index; companies are typed with suggestions
+    departments = autocomplete.indexes['department'].values()
     
     return render_template('search.html',
                          users=filtered_users,
-                         departments=sorted(departments),
-                         companies=sorted(companies),
+                         departments=departments,
                          search_params={
                              'q': query,
                              'department': department,
@@ -142,8 +141,26 @@ def search():
                              'graduation_year': graduation_year
                          })
 
-@app.route('/jobs')
+@main_bp.route('/api/autocomplete')
+@login_required
+def autocomplete_api():
+    """Typeahead suggestions for the search and profile forms"""
+    field = request.args.get('field', '')
+    if field not in autocomplete.FIELDS:
+        abort(400)
+    
+    query = request.args.get('q', '')
+    limit = request.args.get('limit', autocomplete.DEFAULT_LIMIT, type=int)
+    
+    return jsonify({
+        'field': field,
+        'query': query,
+        'suggestions': autocomplete.complete(field, query, limit)
+    })
+
+@main_bp.route('/jobs')
 @login_required
+@conditional(lambda: (versions['jobs'], versions['users']))
 def jobs():
     """Job listings page"""
     all_jobs = Job.get_all_jobs()
@@ -152,13 +169,13 @@ def jobs():
     
     return render_template('jobs.html', jobs=all_jobs)
 
-@app.route('/post_job', methods=['GET', 'POST'])
+@main_bp.route('/post_job', methods=['GET', 'POST'])
 @login_required
 def post_job():
     """Post a new job"""
     current_user = get_current_user()
     if not current_user:
-        return redirect(url_for('login'))
+        return redirect(url_for('auth.login'))
     
     if request.method == 'POST':
         title = request.form.get('title', '').strip()
@@ -184,29 +201,31 @@ def post_job():
             salary_range=salary_range if salary_range else None
         )
         
+        enqueue('roll_up_stats')
         flash('Job posted successfully!', 'success')
-        logging.info(f'New job posted by {current_user.username}: {title}')
-        return redirect(url_for('jobs'))
+        logger.info('New job posted by %s: %s', current_user.username, title)
+        return redirect(url_for('main.jobs'))
     
     return render_template('post_job.html')
 
-@app.route('/events')
+@main_bp.route('/events')
 @login_required
+@conditional(lambda: (versions['events'], versions['users'], date.today()))
 def events():
     """Events listing page"""
     all_events = Event.get_all_events()
     # Sort by date (upcoming first, then by creation date)
     all_events.sort(key=lambda x: (x.date, x.created_at))
     
-    return render_template('events.html', events=all_events)
+    return render_template('events.html', events=all_events, today=date.today())
 
-@app.route('/post_event', methods=['GET', 'POST'])
+@main_bp.route('/post_event', methods=['GET', 'POST'])
 @login_required
 def post_event():
     """Post a new event"""
     current_user = get_current_user()
     if not current_user:
-        return redirect(url_for('login'))
+        return redirect(url_for('auth.login'))
     
     if request.method == 'POST':
         title = request.form.get('title', '').strip()
@@ -235,36 +254,78 @@ def post_event():
             organized_by_id=current_user.id
         )
         
+        enqueue('roll_up_stats')
         flash('Event posted successfully!', 'success')
-        logging.info(f'New event posted by {current_user.username}: {title}')
-        return redirect(url_for('events'))
+        logger.info('New event posted by %s: %s', current_user.username, title)
+        return redirect(url_for('main.events'))
     
     return render_template('post_event.html')
 
-@app.route('/messages')
+# Messages shown per "load older" page of a conversation
+CONVERSATION_PAGE_SIZE = 20
+
+def _inbox_validator():
+    """Validator for the inbox: the viewer's conversations and participant names"""
+    return (inbox_versions.get(session.get('user_id'), 0), versions['users'])
+
+@main_bp.route('/messages')
 @login_required
+@conditional(_inbox_validator)
 def messages():
-    """Messages page"""
+    """Messages page, one entry per conversation"""
+    current_user = get_current_user()
+    if not current_user:
+        return redirect(url_for('auth.login'))
+    
+    user_conversations = Conversation.get_for_user(current_user.id)
+    
+    return render_template('messages.html', conversations=user_conversations)
+
+@main_bp.route('/conversation/<conversation_id>')
+@login_required
+def conversation(conversation_id):
+    """View a conversation, loading older messages a page at a time"""
     current_user = get_current_user()
     if not current_user:
-        return redirect(url_for('login'))
+        return redirect(url_for('auth.login'))
+    
+    thread = Conversation.get_by_id(conversation_id)
+    if not thread or current_user.id not in thread.participant_ids:
+        flash('Conversation not found', 'error')
+        return redirect(url_for('main.messages'))
+    
+    before = request.args.get('before', type=int)
+    page, older_cursor = thread.get_page(before, CONVERSATION_PAGE_SIZE)
+    
+    # "Load older" requests only need the extra messages, not the whole page
+    if request.args.get('partial'):
+        return render_template('_conversation_page.html',
+                             conversation=thread,
+                             page=page,
+                             older_cursor=older_cursor)
     
-    user_messages = Message.get_user_messages(current_user.id)
+    thread.mark_read(current_user.id)
     
-    return render_template('messages.html', messages=user_messages)
+    return render_template('conversation.html',
+                         conversation=thread,
+                         other_user_id=thread.other_participant_id(current_user.id),
+                         other_user_name=thread.other_participant_name(current_user.id),
+                         page=page,
+                         older_cursor=older_cursor)
 
-@app.route('/send_message/<recipient_id>', methods=['GET', 'POST'])
+@main_bp.route('/send_message/<recipient_id>', methods=['GET', 'POST'])
 @login_required
+@rate_limited(message_ip_limiter, message_account_limiter, session_account)
 def send_message(recipient_id):
     """Send a message to another user"""
     current_user = get_current_user()
     if not current_user:
-        return redirect(url_for('login'))
+        return redirect(url_for('auth.login'))
     
     recipient = User.get_by_id(recipient_id)
     if not recipient:
         flash('Recipient not found', 'error')
-        return redirect(url_for('search'))
+        return redirect(url_for('main.search'))
     
     if request.method == 'POST':
         subject = request.form.get('subject', '').strip()
@@ -282,32 +343,33 @@ def send_message(recipient_id):
             content=content
         )
         
+        enqueue('roll_up_stats')
         flash(f'Message sent to {recipient.full_name}!', 'success')
-        logging.info(f'Message sent from {current_user.username} to {recipient.username}')
-        return redirect(url_for('messages'))
+        logger.info('Message sent from %s to %s', current_user.username, recipient.username)
+        return redirect(url_for('main.conversation', conversation_id=message.thread_id))
     
     return render_template('messages.html', recipient=recipient)
 
-@app.route('/message/<message_id>')
+@main_bp.route('/message/<message_id>')
 @login_required
 def view_message(message_id):
     """View a specific message"""
     current_user = get_current_user()
     if not current_user:
-        return redirect(url_for('login'))
+        return redirect(url_for('auth.login'))
     
     message = Message.get_by_id(message_id)
     if not message:
         flash('Message not found', 'error')
-        return redirect(url_for('messages'))
+        return redirect(url_for('main.messages'))
     
     # Check if user has permission to view this message
     if message.sender_id != current_user.id and message.receiver_id != current_user.id:
         flash('You do not have permission to view this message', 'error')
-        return redirect(url_for('messages'))
+        return redirect(url_for('main.messages'))
     
     # Mark as read if user is the receiver
     if message.receiver_id == current_user.id:
-        message.is_read = True
+        message.mark_read()
     
     return render_template('messages.html', view_message=message)
@@ -0,0 +1,100 @@
+"""
+LRU cache of directory search results keyed by normalized filters
+"""
+
+from collections import OrderedDict
+import threading
+
+DEFAULT_MAX_ENTRIES = 512
+
+# User attributes the search filters look at
+SEARCH_FIELDS = ('full_name', 'username', 'department', 'current_company', 'graduation_year', 'is_active')
+
+
+def normalize_filters(query, department, company, graduation_year):
+    """Cache key for a search: lowercased text filters and an int year (or None)"""
+    try:
+        year = int(graduation_year) if graduation_year else None
+    except ValueError:
+        year = None  # search() ignores a year it cannot parse
+    return (query.strip().lower(), department.strip().lower(), company.strip().lower(), year)
+
+
+def search_fields(user):
+    """Snapshot of the attributes a search can match on"""
+    return {field: getattr(user, field) for field in SEARCH_FIELDS}
+
+
+def matches(key, fields):
+    """Whether a user with these attributes belongs in the results for ``key``"""
+    query, department, company, year = key
+    if not fields['is_active']:
+        return False
+    if query and query not in fields['full_name'].lower() and query not in (fields['username'] or '').lower():
+        return False
+    if department and department not in (fields['department'] or '').lower():
+        return False
+    if company and company not in (fields['current_company'] or '').lower():
+        return False
+    if year is not None and fields['graduation_year'] != year:
+        return False
+    return True
+
+
+class SearchCache:
+    """Least-recently-used map from normalized filters to matching user ids"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.generation = 0  # bumped on every change, so stale computations are not stored
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Cached user ids for ``key``, or None"""
+        with self._lock:
+            ids = self._entries.get(key)
+            if ids is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return ids
+
+    def put(self, key, ids, generation):
+        """Store results computed when the cache was at ``generation``"""
+        with self._lock:
+            if generation != self.generation:
+                return  # a user changed while the results were being computed
+            self._entries[key] = ids
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def user_changed(self, before, user):
+        """Drop the entries whose results include the user before or after a change"""
+        after = search_fields(user)
+        with self._lock:
+            self.generation += 1
+            stale = [key for key in self._entries
+                     if (before and matches(key, before)) or matches(key, after)]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def stats(self):
+        """Hit ratio and size figures for the admin panel"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'entries': len(self._entries),
+            'invalidations': self.invalidations
+        }
+
+
+search_cache = SearchCache()
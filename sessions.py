@@ -0,0 +1,184 @@
+"""
+Server-side session store: the cookie carries only a short random session id
+"""
+
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+import secrets
+import threading
+
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+# Expired records are swept after this many saves
+PRUNE_EVERY = 1000
+
+# Bounds on stored sessions; anonymous ones (flash messages only) are capped separately so
+# cookieless traffic cannot evict signed-in users
+MAX_USER_SESSIONS = 100000
+MAX_ANONYMOUS_SESSIONS = 10000
+DEFAULT_ANONYMOUS_LIFETIME = timedelta(minutes=10)
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session data kept in the store, tracking whether the request changed it"""
+
+    def __init__(self, sid, data=None, new=True):
+        def on_update(session):
+            session.modified = True
+        super().__init__(data or {}, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.rotate = False
+
+    def regenerate(self):
+        """Issue a new session id when the response is saved, e.g. after logging in"""
+        self.rotate = True
+        self.modified = True
+
+
+class SessionRecord:
+    """Stored session: its data, the owning user and that user's generation when it was created"""
+
+    __slots__ = ('data', 'user_id', 'generation', 'lifetime', 'expires_at')
+
+    def __init__(self, data, user_id, generation, lifetime, expires_at):
+        self.data = data
+        self.user_id = user_id
+        self.generation = generation
+        self.lifetime = lifetime
+        self.expires_at = expires_at
+
+
+class SessionStore:
+    """In-memory session records, LRU-bounded, with per-user generations for O(1) revocation"""
+
+    def __init__(self, max_user_sessions=MAX_USER_SESSIONS, max_anonymous_sessions=MAX_ANONYMOUS_SESSIONS):
+        self.max_user_sessions = max_user_sessions
+        self.max_anonymous_sessions = max_anonymous_sessions
+        self._users = OrderedDict()      # sid -> record of a signed-in session
+        self._anonymous = OrderedDict()  # sid -> record without a user id
+        self._generations = {}  # user id -> bumped to revoke every session of that user
+        self._saves = 0
+        self._lock = threading.Lock()
+
+    def _is_stale(self, record, now):
+        return record.expires_at < now or (
+            record.user_id and record.generation != self._generations.get(record.user_id, 0))
+
+    def load(self, sid, now):
+        """Data for a live session id, or None if unknown, expired or revoked; renews the expiry"""
+        with self._lock:
+            for records in (self._users, self._anonymous):
+                record = records.get(sid)
+                if record is not None:
+                    break
+            else:
+                return None
+            if self._is_stale(record, now):
+                del records[sid]
+                return None
+            record.expires_at = now + record.lifetime
+            records.move_to_end(sid)
+            return dict(record.data)
+
+    def save(self, sid, data, lifetime, now):
+        """Store a session's data under ``sid`` for ``lifetime`` from now"""
+        user_id = data.get('user_id')
+        with self._lock:
+            existing = self._users.pop(sid, None) or self._anonymous.pop(sid, None)
+            if existing is not None and existing.user_id == user_id:
+                # Keep the original generation so a request that raced a revocation cannot renew it
+                generation = existing.generation
+            else:
+                generation = self._generations.get(user_id, 0)
+            records, limit = ((self._users, self.max_user_sessions) if user_id
+                              else (self._anonymous, self.max_anonymous_sessions))
+            records[sid] = SessionRecord(dict(data), user_id, generation, lifetime, now + lifetime)
+            if len(records) > limit:
+                records.popitem(last=False)
+            self._saves += 1
+            if self._saves % PRUNE_EVERY == 0:
+                self._prune(now)
+
+    def delete(self, sid):
+        with self._lock:
+            self._users.pop(sid, None)
+            self._anonymous.pop(sid, None)
+
+    def revoke_user(self, user_id):
+        """Invalidate every session of a user; their records are dropped when next seen or swept"""
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+    def _prune(self, now):
+        """Drop expired and revoked records (called with the lock held)"""
+        for records in (self._users, self._anonymous):
+            for sid in [sid for sid, record in records.items() if self._is_stale(record, now)]:
+                del records[sid]
+
+    def __len__(self):
+        return len(self._users) + len(self._anonymous)
+
+
+session_store = SessionStore()
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Flask session interface backed by ``session_store``"""
+
+    def __init__(self, store=session_store):
+        self.store = store
+
+    @staticmethod
+    def _new_sid():
+        return secrets.token_urlsafe(16)
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            data = self.store.load(sid, datetime.now(timezone.utc))
+            if data is not None:
+                return ServerSideSession(sid, data, new=False)
+        return ServerSideSession(self._new_sid())
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if session.rotate:
+            self.store.delete(session.sid)
+            session.sid = self._new_sid()
+
+        if not session.modified and not self.should_set_cookie(app, session):
+            return
+
+        if session.get('user_id'):
+            lifetime = app.permanent_session_lifetime
+        else:
+            lifetime = app.config.get('ANONYMOUS_SESSION_LIFETIME', DEFAULT_ANONYMOUS_LIFETIME)
+        self.store.save(session.sid, dict(session), lifetime, datetime.now(timezone.utc))
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+        response.vary.add('Cookie')
+
+
+def init_sessions(app):
+    """Keep session data on the server instead of in a signed cookie"""
+    app.session_interface = ServerSideSessionInterface()
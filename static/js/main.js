@@ -16,6 +16,8 @@ const AlumniPortal = {
         this.setupNotifications();
         this.setupTableSorting();
         this.setupImageLazyLoading();
+        this.setupConversationPaging();
+        this.setupAutocomplete();
         console.log('Alumni Portal initialized');
     },
 
@@ -264,6 +266,85 @@ const AlumniPortal = {
         }
     },
 
+    // Load older conversation messages in place instead of reloading the page
+    setupConversationPaging: function() {
+        const container = document.getElementById('conversation-messages');
+        if (!container) {
+            return;
+        }
+
+        container.addEventListener('click', function(e) {
+            const link = e.target.closest('a[data-load-older]');
+            if (!link) {
+                return;
+            }
+            e.preventDefault();
+            AlumniPortal.showLoading(link);
+
+            const url = new URL(link.href, window.location.origin);
+            url.searchParams.set('partial', '1');
+            fetch(url, { credentials: 'same-origin' })
+                .then(response => response.text())
+                .then(html => {
+                    const olderBlock = link.closest('[data-older-messages]');
+                    const previousHeight = container.scrollHeight;
+                    olderBlock.insertAdjacentHTML('afterend', html);
+                    olderBlock.remove();
+                    // Keep the messages the user was reading in view
+                    container.scrollTop += container.scrollHeight - previousHeight;
+                    if (typeof feather !== 'undefined') {
+                        feather.replace();
+                    }
+                })
+                .catch(() => {
+                    // Fall back to a normal page load
+                    window.location.href = link.href;
+                });
+        });
+    },
+
+    // Typeahead suggestions for inputs marked with data-autocomplete
+    setupAutocomplete: function() {
+        document.querySelectorAll('input[data-autocomplete]').forEach(input => {
+            const datalist = document.createElement('datalist');
+            datalist.id = `${input.id}-suggestions`;
+            input.after(datalist);
+            input.setAttribute('list', datalist.id);
+
+            let controller = null;
+            const fetchSuggestions = AlumniPortal.debounce(function() {
+                const query = input.value.trim();
+                if (!query) {
+                    datalist.innerHTML = '';
+                    return;
+                }
+
+                // Only the latest keystroke's answer matters
+                if (controller) {
+                    controller.abort();
+                }
+                controller = new AbortController();
+
+                const url = new URL(input.dataset.autocompleteUrl, window.location.origin);
+                url.searchParams.set('field', input.dataset.autocomplete);
+                url.searchParams.set('q', query);
+                fetch(url, { credentials: 'same-origin', signal: controller.signal })
+                    .then(response => response.json())
+                    .then(data => {
+                        datalist.innerHTML = '';
+                        data.suggestions.forEach(suggestion => {
+                            const option = document.createElement('option');
+                            option.value = suggestion;
+                            datalist.appendChild(option);
+                        });
+                    })
+                    .catch(() => {});
+            }, 100);
+
+            input.addEventListener('input', fetchSuggestions);
+        });
+    },
+
     // Utility functions
     showLoading: function(element) {
         if (element) {
@@ -0,0 +1,249 @@
+"""
+In-process background task queue for work the request does not need to wait for
+"""
+
+from collections import deque
+import itertools
+import json
+import logging
+import os
+import queue
+import statistics
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Lower numbers run first
+HIGH = 0
+NORMAL = 5
+LOW = 9
+
+# Seconds to wait before retry n is 2 ** n * RETRY_BACKOFF
+RETRY_BACKOFF = 0.5
+
+# Registered task functions by name, so queued (and journaled) work can be looked up
+registry = {}
+
+
+class TaskSpec:
+    """A registered task function and its defaults"""
+
+    def __init__(self, name, func, priority, retries, unique):
+        self.name = name
+        self.func = func
+        self.priority = priority
+        self.retries = retries
+        self.unique = unique  # at most one pending copy; later requests coalesce into it
+
+
+class QueuedTask:
+    """One pending run of a task"""
+
+    __slots__ = ('id', 'name', 'args', 'kwargs', 'priority', 'attempts', 'enqueued_at')
+
+    def __init__(self, name, args, kwargs, priority, task_id=None, attempts=0):
+        self.id = task_id or uuid.uuid4().hex
+        self.name = name
+        self.args = list(args)
+        self.kwargs = dict(kwargs)
+        self.priority = priority
+        self.attempts = attempts
+        self.enqueued_at = time.monotonic()
+
+    def to_dict(self):
+        """Serialize for the durable journal"""
+        return {'id': self.id, 'name': self.name, 'args': self.args, 'kwargs': self.kwargs,
+                'priority': self.priority, 'attempts': self.attempts}
+
+
+def task(name=None, priority=NORMAL, retries=3, unique=False):
+    """Decorator registering a function as a background task"""
+    def decorator(func):
+        task_name = name or func.__name__
+        registry[task_name] = TaskSpec(task_name, func, priority, retries, unique)
+        return func
+    return decorator
+
+
+class TaskQueue:
+    """Priority queue drained by a bounded pool of worker threads"""
+
+    def __init__(self, workers=2, max_size=10000, journal_path=None):
+        self.workers = workers
+        self.journal_path = journal_path
+        self._queue = queue.PriorityQueue(max_size)
+        self._sequence = itertools.count()  # keeps FIFO order within a priority
+        self._pending_unique = set()
+        self._lock = threading.Lock()
+        self._threads = []
+
+        self.enqueued = 0
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self._wait_ms = deque(maxlen=1000)
+        self._run_ms = deque(maxlen=1000)
+
+    def start(self):
+        """Start the worker threads, first re-queueing work left in the journal"""
+        if self._threads:
+            return
+        if self.journal_path:
+            self._replay_journal()
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'task-worker-{number}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def enqueue(self, name, *args, priority=None, **kwargs):
+        """Queue a registered task and return immediately"""
+        spec = registry[name]
+        with self._lock:
+            if spec.unique:
+                if name in self._pending_unique:
+                    return
+                self._pending_unique.add(name)
+        queued = QueuedTask(name, args, kwargs, spec.priority if priority is None else priority)
+        try:
+            self._journal('add', queued)
+            self._put(queued)
+        except Exception:
+            if spec.unique:
+                with self._lock:
+                    self._pending_unique.discard(name)
+            raise
+        self.enqueued += 1
+
+    def _put(self, queued):
+        """Hand a task to the workers, running it inline if the queue is full"""
+        try:
+            self._queue.put_nowait((queued.priority, next(self._sequence), queued))
+        except queue.Full:
+            logger.warning('Task queue full, running %s inline', queued.name)
+            self._run(queued)
+
+    def _work(self):
+        """Worker loop"""
+        while True:
+            _, _, queued = self._queue.get()
+            try:
+                self._run(queued)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, queued):
+        """Run one task, scheduling a retry or recording the failure if it raises"""
+        spec = registry.get(queued.name)
+        if spec is None:
+            logger.error('Unknown task %s dropped', queued.name)
+            self._journal('done', queued)
+            return
+
+        with self._lock:
+            self._pending_unique.discard(queued.name)
+        started = time.monotonic()
+        self._wait_ms.append((started - queued.enqueued_at) * 1000)
+        try:
+            spec.func(*queued.args, **queued.kwargs)
+        except Exception:
+            queued.attempts += 1
+            if queued.attempts <= spec.retries:
+                self.retried += 1
+                delay = RETRY_BACKOFF * 2 ** queued.attempts
+                logger.warning('Task %s failed, retry %d in %.1fs', queued.name, queued.attempts, delay)
+                timer = threading.Timer(delay, self._retry, (queued,))
+                timer.daemon = True
+                timer.start()
+                return
+            self.failed += 1
+            logger.exception('Task %s failed after %d attempts', queued.name, queued.attempts)
+        else:
+            self.completed += 1
+        finally:
+            self._run_ms.append((time.monotonic() - started) * 1000)
+        self._journal('done', queued)
+
+    def _retry(self, queued):
+        """Put a failed task back on the queue"""
+        queued.enqueued_at = time.monotonic()
+        self._put(queued)
+
+    def _journal(self, op, queued):
+        """Append a record to the durable queue file, if one is configured"""
+        if not self.journal_path:
+            return
+        record = {'op': op, 'id': queued.id}
+        if op == 'add':
+            record['task'] = queued.to_dict()
+        with self._lock:
+            with open(self.journal_path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+
+    def _replay_journal(self):
+        """Re-queue tasks added but not finished before the last shutdown, then compact the file"""
+        pending = {}
+        try:
+            with open(self.journal_path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # partially written last line
+                    if record['op'] == 'add':
+                        pending[record['id']] = record['task']
+                    else:
+                        pending.pop(record['id'], None)
+        except FileNotFoundError:
+            pass
+
+        with open(self.journal_path, 'w') as f:
+            for data in pending.values():
+                f.write(json.dumps({'op': 'add', 'id': data['id'], 'task': data}) + '\n')
+
+        for data in pending.values():
+            spec = registry.get(data['name'])
+            if spec is None:
+                continue
+            queued = QueuedTask(data['name'], data['args'], data['kwargs'], data['priority'],
+                                task_id=data['id'], attempts=data['attempts'])
+            if spec.unique:
+                if spec.name in self._pending_unique:
+                    self._journal('done', queued)  # coalesced into the copy already queued
+                    continue
+                self._pending_unique.add(spec.name)
+            self._put(queued)
+        if pending:
+            logger.info('Recovered %d queued tasks from %s', len(pending), self.journal_path)
+
+    def stats(self):
+        """Queue depth, outcomes and latency figures for the admin panel"""
+        wait_ms = list(self._wait_ms)
+        run_ms = list(self._run_ms)
+        return {
+            'depth': self._queue.qsize(),
+            'workers': len(self._threads),
+            'enqueued': self.enqueued,
+            'completed': self.completed,
+            'failed': self.failed,
+            'retried': self.retried,
+            'avg_wait_ms': statistics.fmean(wait_ms) if wait_ms else 0.0,
+            'p95_wait_ms': statistics.quantiles(wait_ms, n=20)[-1] if len(wait_ms) > 1 else 0.0,
+            'avg_run_ms': statistics.fmean(run_ms) if run_ms else 0.0,
+        }
+
+
+task_queue = TaskQueue()
+
+
+def enqueue(name, *args, **kwargs):
+    """Queue a registered task on the application's task queue"""
+    task_queue.enqueue(name, *args, **kwargs)
+
+
+def init_tasks(app):
+    """Configure and start the application's task queue"""
+    task_queue.workers = app.config.get('TASK_WORKERS', int(os.environ.get('TASK_WORKERS', 2)))
+    task_queue.journal_path = app.config.get('TASK_QUEUE_FILE', os.environ.get('TASK_QUEUE_FILE'))
+    task_queue.start()
@@ -0,0 +1,223 @@
+"""
+Hot/cold tiering: inactive and aged records move to a compressed, append-only segment store
+"""
+
+from datetime import datetime, timedelta
+import atexit
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import zlib
+
+import models
+from tasks import task, enqueue, LOW
+
+logger = logging.getLogger(__name__)
+
+# Segments are rotated once they reach this size
+SEGMENT_SIZE = 8 * 1024 * 1024
+
+# Defaults, overridable through app config
+DEFAULT_SWEEP_INTERVAL = 300                    # seconds between sweeps
+DEFAULT_INACTIVE_AFTER = timedelta(days=1)      # deactivated users, jobs and events
+DEFAULT_READ_MESSAGE_AFTER = timedelta(days=30) # read messages
+
+# Small per-record summaries kept in memory, so admin lists and uniqueness checks need no disk reads
+SUMMARY_FIELDS = {
+    'users': ('id', 'username', 'email', 'full_name', 'user_type', 'created_at'),
+    'jobs': ('id', 'title', 'company', 'created_at'),
+    'events': ('id', 'title', 'date', 'created_at'),
+    'messages': ('id', 'thread_id', 'created_at'),
+}
+
+
+class SegmentStore:
+    """Append-only segment files of zlib-compressed pickled records"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._index = {}       # (collection, id) -> (segment, offset, length)
+        self._summaries = {collection: {} for collection in SUMMARY_FIELDS}
+        self._live_bytes = {}  # segment -> bytes still referenced by the index
+        self._segment = 0
+        self._file = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._open_segment()
+
+    def _path(self, segment):
+        return os.path.join(self.directory, f'segment-{segment:05d}.dat')
+
+    def _open_segment(self):
+        """Start writing to a new segment file"""
+        if self._file:
+            self._file.close()
+        self._segment += 1
+        self._file = open(self._path(self._segment), 'ab')
+        self._live_bytes[self._segment] = 0
+
+    def _release(self, location):
+        """Forget a record's bytes, deleting its segment once nothing in it is live"""
+        segment, _, length = location
+        self._live_bytes[segment] -= length
+        if segment != self._segment and not self._live_bytes[segment]:
+            del self._live_bytes[segment]
+            os.remove(self._path(segment))
+
+    def archive(self, collection, obj, hot_store):
+        """Move ``obj`` from its hot dictionary into the store; False if it changed meanwhile"""
+        version = obj.version
+        data = zlib.compress(pickle.dumps(obj, pickle.HIGHEST_PROTOCOL))
+        summary = {field: getattr(obj, field, None) for field in SUMMARY_FIELDS[collection]}
+        with self._lock:
+            # Writers touch() before taking this lock in reinstate(), so a write either shows
+            # up here or finds the record archived and puts it back
+            if obj.version != version or hot_store.get(obj.id) is not obj:
+                return False
+            if self._file.tell() + len(data) > SEGMENT_SIZE and self._file.tell():
+                self._open_segment()
+            offset = self._file.tell()
+            self._file.write(data)
+            self._file.flush()
+            key = (collection, obj.id)
+            if key in self._index:
+                self._release(self._index[key])
+            self._index[key] = (self._segment, offset, len(data))
+            self._live_bytes[self._segment] += len(data)
+            self._summaries[collection][obj.id] = summary
+            del hot_store[obj.id]
+            return True
+
+    def reinstate(self, collection, obj, hot_store):
+        """Make a just-modified object the live copy again if it was archived or restored under a writer"""
+        with self._lock:
+            if hot_store.get(obj.id) is obj:
+                return
+            key = (collection, obj.id)
+            if key not in self._index and obj.id not in hot_store:
+                return  # not a tiered record (conversations share the messages collection)
+            location = self._index.pop(key, None)
+            if location is not None:
+                del self._summaries[collection][obj.id]
+                self._release(location)
+            hot_store[obj.id] = obj
+
+    def restore(self, collection, object_id, hot_store):
+        """Fault a record back into its hot dictionary; returns it, or None if not archived"""
+        with self._lock:
+            if object_id in hot_store:
+                return hot_store[object_id]  # another thread got here first
+            location = self._index.get((collection, object_id))
+            if location is None:
+                return None
+            segment, offset, length = location
+            # Decode before touching the index, so a failed read leaves the record archived
+            with open(self._path(segment), 'rb') as f:
+                f.seek(offset)
+                obj = pickle.loads(zlib.decompress(f.read(length)))
+            del self._index[(collection, object_id)]
+            del self._summaries[collection][object_id]
+            self._release(location)
+            # Count its age from now, so the next sweep does not archive it straight back
+            obj.updated_at = datetime.now()
+            hot_store[object_id] = obj
+            return obj
+
+    def find(self, collection, field, value):
+        """ID of an archived record whose summary has ``field == value``"""
+        with self._lock:
+            for object_id, summary in self._summaries[collection].items():
+                if summary.get(field) == value:
+                    return object_id
+        return None
+
+    def summary(self, collection, object_id):
+        """Summary of one archived record, or None"""
+        with self._lock:
+            return self._summaries[collection].get(object_id)
+
+    def summaries(self, collection):
+        """Summaries of the archived records in a collection"""
+        with self._lock:
+            return list(self._summaries[collection].values())
+
+    def count(self, collection):
+        """Number of archived records in a collection"""
+        return len(self._summaries[collection])
+
+    def stats(self):
+        """Archived record counts and bytes on disk"""
+        with self._lock:
+            counts = {collection: len(summaries) for collection, summaries in self._summaries.items()}
+            counts['bytes'] = sum(self._live_bytes.values())
+            counts['segments'] = len(self._live_bytes)
+        return counts
+
+
+# Sweep thresholds, set by init_tiering
+policy = {
+    'inactive_after': DEFAULT_INACTIVE_AFTER,
+    'read_message_after': DEFAULT_READ_MESSAGE_AFTER,
+}
+
+
+def _candidates(now):
+    """Records that should move to the cold tier, as (collection, object) pairs"""
+    inactive_cutoff = now - policy['inactive_after']
+    message_cutoff = now - policy['read_message_after']
+    for collection in ('users', 'jobs', 'events'):
+        for obj in list(models.stores[collection].values()):
+            if not obj.is_active and obj.updated_at < inactive_cutoff:
+                yield collection, obj
+    for message in list(models.messages.values()):
+        if message.is_read and message.updated_at < message_cutoff:
+            yield 'messages', message
+
+
+@task('sweep_cold_records', priority=LOW, unique=True)
+def sweep_cold_records():
+    """Background task: move inactive and aged records to the cold tier"""
+    store = models.cold_store
+    if store is None:
+        return
+    moved = 0
+    for collection, obj in _candidates(datetime.now()):
+        if store.archive(collection, obj, models.stores[collection]):
+            moved += 1
+    if moved:
+        logger.info('Moved %d records to cold storage', moved)
+        enqueue('roll_up_stats')
+
+
+def _schedule_sweeps(interval, stop):
+    """Timer loop queueing a sweep every ``interval`` seconds"""
+    while not stop.wait(interval):
+        enqueue('sweep_cold_records')
+
+
+def init_tiering(app):
+    """Create the cold segment store and start the periodic sweeper"""
+    if models.cold_store is not None:
+        return
+
+    # Segment offsets are only meaningful to the process that wrote them, so each
+    # worker gets its own subdirectory and removes only that one at exit
+    parent = app.config.get('TIERING_DIR', os.environ.get('TIERING_DIR'))
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    directory = tempfile.mkdtemp(prefix='alumni-cold-', dir=parent or None)
+    atexit.register(shutil.rmtree, directory, True)
+
+    policy['inactive_after'] = app.config.get('TIERING_INACTIVE_AFTER', DEFAULT_INACTIVE_AFTER)
+    policy['read_message_after'] = app.config.get('TIERING_READ_MESSAGE_AFTER', DEFAULT_READ_MESSAGE_AFTER)
+    models.cold_store = SegmentStore(directory)
+
+    interval = app.config.get('TIERING_SWEEP_INTERVAL', DEFAULT_SWEEP_INTERVAL)
+    if interval:
+        stop = threading.Event()
+        thread = threading.Thread(target=_schedule_sweeps, args=(interval, stop),
+                                  name='cold-tier-sweeper', daemon=True)
+        thread.start()
@@ -72,17 +72,8 @@ def get_job_types():
         'remote'
     ]
 
-# Add utility functions to Jinja2 global context
-from app import app
-
-@app.template_global()
-def format_date_filter(date_obj):
-    return format_date(date_obj)
-
-@app.template_global()
-def format_date_short_filter(date_obj):
-    return format_date_short(date_obj)
-
-@app.template_global()
-def truncate_text_filter(text, max_length=100):
-    return truncate_text(text, max_length)
+def register_template_helpers(app):
+    """Add utility functions to the Jinja2 global context"""
+    app.add_template_global(format_date, 'format_date_filter')
+    app.add_template_global(format_date_short, 'format_date_short_filter')
+    app.add_template_global(truncate_text, 'truncate_text_filter')